@@ -5,22 +5,43 @@ keep images with fire smoke.
 The folder structure remains the same, only the non-smoke images are discarded.
 
 Usage:
-    python filter_data_pyronear_ds_smoke.py --dir-dataset <path_to_dataset> --save-dir <path_to_save_dir> [--allowed-dataset-prefixes <prefix1> <prefix2> ...] [-log <loglevel>]
+    python filter_data_pyronear_ds_smoke.py --dir-dataset <path_to_dataset> --save-dir <path_to_save_dir> [--allowed-dataset-prefixes <prefix1> <prefix2> ...] [--jobs <jobs>] [--link-mode <link_mode>] [-log <loglevel>]
 
 Arguments:
     --save-dir: Directory to save the filtered dataset. Default is ./data/interim/filtered/smoke/pyronear_ds_03_2024/.
     --dir-dataset: Directory containing the pyro-sdis dataset. Default is ./data/raw/pyronear_ds_03_2024/.
     --allowed-dataset-prefixes: Set of allowed data prefixes to use. Default is ["pyronear", "awf", "random", "adf"].
+    --jobs: Number of threads used to walk the dataset and copy the files. Default is the number of CPUs.
+    --link-mode: How to bring the files over to the save dir, one of copy, hardlink, reflink. Default is copy.
     -log, --loglevel: Provide logging level. Example --loglevel debug, default=warning.
 """
 
 import argparse
 import logging
-import shutil
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterable, Iterator
 
 from tqdm import tqdm
 
+from pyro_dataset.utils import LINK_MODES, link_or_copy_file
+
+
+@dataclass
+class FilterCounts:
+    """
+    Simple class to keep track of the images seen while filtering the dataset.
+
+    Attributes:
+        number_images (int): number of images found in the dataset.
+        number_images_with_smoke (int): number of images that contain smoke.
+    """
+
+    number_images: int = 0
+    number_images_with_smoke: int = 0
+
 
 def make_cli_parser() -> argparse.ArgumentParser:
     """
@@ -46,6 +67,19 @@ def make_cli_parser() -> argparse.ArgumentParser:
         type=str,
         default=["pyronear", "awf", "random", "adf"],
     )
+    parser.add_argument(
+        "--jobs",
+        help="Number of threads used to walk the dataset and copy the files.",
+        type=int,
+        default=os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        "--link-mode",
+        help="How to bring the files over to the save dir: copy the data, hardlink or reflink (copy on write) it.",
+        type=str,
+        choices=LINK_MODES,
+        default="copy",
+    )
     parser.add_argument(
         "-log",
         "--loglevel",
@@ -64,91 +98,252 @@ def validate_parsed_args(args: dict) -> bool:
             f"invalid --dir-dataset, dir {args['dir_dataset']} does not exist"
         )
         return False
+    elif args["jobs"] < 1:
+        logging.error(f"invalid --jobs, {args['jobs']} should be at least 1")
+        return False
     else:
         return True
 
 
-def filepath_image_to_filepath_label(filepath_image: Path) -> Path:
+def filepath_image_to_filepath_label(filepath_image: Path) -> Path | None:
     """
     Given a filepath_image it returns its associated filepath_label.
 
+    __Note__: Only the last `images` directory of the filepath is replaced,
+    following the ultralytics convention.
+
+    Returns:
+        filepath_label (Path | None): the associated label filepath, None when
+        filepath_image is not in an `images` directory.
+    """
+    parts = list(filepath_image.parts)
+    if "images" not in parts:
+        return None
+    idx = len(parts) - 1 - parts[::-1].index("images")
+    parts[idx] = "labels"
+    return Path(*parts).with_suffix(".txt")
+
+
+def scan_dataset_directory(dirpath: str) -> tuple[list[Path], list[str]]:
+    """
+    Scan a single directory of the dataset, without recursing.
+    The `labels` directories are skipped as they do not contain any image.
+
+    Returns:
+        filepaths (list[Path]): image filepaths found in dirpath.
+        dirpaths (list[str]): sub directories found in dirpath.
+    """
+    filepaths = []
+    dirpaths = []
+    with os.scandir(dirpath) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name != "labels":
+                    dirpaths.append(entry.path)
+            elif entry.name.endswith(".jpg"):
+                filepaths.append(Path(entry.path))
+    return filepaths, dirpaths
+
+
+def list_dataset_images(dir_dataset: Path, jobs: int) -> Iterator[Path]:
+    """
+    Lazily list all images from the `dir_dataset`
+
+    __Note__: The traversal is I/O bound, so each directory is scanned in
+    its own thread and its images are yielded as soon as it is scanned.
+
     Returns:
-        filepath_label (Path): the associated label filepath.
+        filepaths (Iterator[Path]): all image filepaths from dir_dataset.
     """
-    return Path(str(filepath_image).replace("images", "labels").replace(".jpg", ".txt"))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = {executor.submit(scan_dataset_directory, os.fspath(dir_dataset))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filepaths, dirpaths = future.result()
+                for dirpath in dirpaths:
+                    pending.add(executor.submit(scan_dataset_directory, dirpath))
+                yield from filepaths
 
 
-def list_dataset_images(dir_dataset: Path) -> list[Path]:
+def list_label_filenames_with_smoke(
+    dir_labels: Path,
+    allowed_prefixes: frozenset[str],
+) -> set[str]:
     """
-    List all images from the `dir_dataset`
+    List the filenames of the non empty labels of `dir_labels` that have one
+    of the `allowed_prefixes`.
+
+    __Note__: Only the filenames are kept rather than the directory entries,
+    and only the labels with an allowed prefix are stated.
 
     Returns:
-        filepaths (list[Path]): all image filepaths from dir_dataset.
+        filenames (set[str]): empty if dir_labels does not exist.
     """
-    return list(dir_dataset.glob("**/*.jpg"))
+    try:
+        with os.scandir(dir_labels) as entries:
+            return {
+                entry.name
+                for entry in entries
+                if has_dataset_prefix(filepath=entry, allowed_prefixes=allowed_prefixes)
+                and entry.is_file()
+                and entry.stat().st_size > 0
+            }
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
 
 
-def has_smoke(filepath_label: Path) -> bool:
+def has_smoke(filepath_label: Path, label_filenames_with_smoke: set[str]) -> bool:
     """
     Does the `filepath_label` contain a smoke?
+    `label_filenames_with_smoke` is the listing of its directory, see
+    `list_label_filenames_with_smoke`.
+
+    __Note__: Missing labels are found without any stat call.
 
     Returns:
         has_smoke? (bool): whether or not the filepath has a smoke detected in it.
     """
-    return (
-        filepath_label.exists()
-        and filepath_label.is_file()
-        and filepath_label.stat().st_size > 0
-    )
+    return filepath_label.name in label_filenames_with_smoke
 
 
-def has_dataset_prefix(filepath_image: Path, allowed_prefixes: list[str]) -> bool:
+def has_dataset_prefix(
+    filepath: Path | os.DirEntry,
+    allowed_prefixes: frozenset[str],
+) -> bool:
     """
-    Does the filepath_image contain the allowed prefix?
+    Does the filepath contain the allowed prefix?
+    The `allowed_prefixes` are expected to be lowercased.
 
     Returns:
         has_prefix? (bool): whether or not the filepath has the prefix in it.
     """
-    prefix = filepath_image.name.split("_")[0].lower()
+    prefix = filepath.name.partition("_")[0].lower()
     return prefix in allowed_prefixes
 
 
 def filter_dataset(
-    filepaths_images: list[Path],
+    filepaths_images: Iterable[Path],
     allowed_dataset_prefixes: list[str],
-) -> list[Path]:
+    filter_counts: FilterCounts,
+) -> Iterator[Path]:
     """
-    Filter the list of images that contain fire smoke.
+    Filter the images that contain fire smoke, `filter_counts` is updated
+    along the way.
+
+    __Note__: Lazily yields the images so that they can be copied over as
+    soon as they are found, while their label is still hot in the cache.
+    Only the listing of the current label directory is kept in memory, so
+    memory is bounded by the largest label directory. The images are
+    expected to be grouped by directory, as `list_dataset_images` does,
+    otherwise label directories are listed again.
 
     Returns:
-        filepaths (list[Path]): List of image filepaths that contain smoke.
+        filepaths (Iterator[Path]): image filepaths that contain smoke.
     """
-    filepaths_images_with_smoke = []
-    for filepath_image in tqdm(filepaths_images):
+    allowed_prefixes = frozenset(prefix.lower() for prefix in allowed_dataset_prefixes)
+    dir_labels_listed = None
+    label_filenames_with_smoke = set()
+    # Refresh the progress bar sparingly as each iteration is cheap.
+    for filepath_image in tqdm(
+        filepaths_images, mininterval=0.5, miniters=256, smoothing=0
+    ):
+        filter_counts.number_images += 1
+        # Check the prefix first as it is cheap and saves a stat call on the
+        # label of every image from a dataset that is not allowed.
+        if not has_dataset_prefix(
+            filepath=filepath_image, allowed_prefixes=allowed_prefixes
+        ):
+            continue
         filepath_label = filepath_image_to_filepath_label(filepath_image)
-        if has_smoke(filepath_label=filepath_label) and has_dataset_prefix(
-            filepath_image=filepath_image, allowed_prefixes=allowed_dataset_prefixes
+        if filepath_label is None:
+            continue
+        if filepath_label.parent != dir_labels_listed:
+            dir_labels_listed = filepath_label.parent
+            label_filenames_with_smoke = list_label_filenames_with_smoke(
+                dir_labels=dir_labels_listed,
+                allowed_prefixes=allowed_prefixes,
+            )
+        if has_smoke(
+            filepath_label=filepath_label,
+            label_filenames_with_smoke=label_filenames_with_smoke,
         ):
-            filepaths_images_with_smoke.append(filepath_image)
+            filter_counts.number_images_with_smoke += 1
+            yield filepath_image
 
-    return filepaths_images_with_smoke
 
+def copy_image_and_label(
+    filepath_image: Path,
+    filepath_label: Path,
+    save_dir: Path,
+    dir_dataset: Path,
+    link_mode: str,
+) -> None:
+    """
+    Copy the filepath_image over to the save dir along with its filepath label.
+    The destination directories are expected to exist.
 
-def copy_over(filepaths_images: list[Path], save_dir: Path, dir_dataset: Path) -> None:
+    Returns:
+        None
+    """
+    filepath_image_destination = save_dir / filepath_image.relative_to(dir_dataset)
+    filepath_label_destination = save_dir / filepath_label.relative_to(dir_dataset)
+    link_or_copy_file(filepath_image, filepath_image_destination, link_mode)
+    link_or_copy_file(filepath_label, filepath_label_destination, link_mode)
+
+
+def copy_over(
+    filepaths_images: Iterable[Path],
+    save_dir: Path,
+    dir_dataset: Path,
+    jobs: int,
+    link_mode: str,
+) -> None:
     """
     Copy the filepaths_images over to the save dir along with their filepaths labels.
 
+    __Note__: The copies are I/O bound and are run concurrently using `jobs` threads.
+    The files are hardlinked or reflinked instead when `link_mode` says so.
+    The filepaths_images are consumed lazily, with a bounded number of
+    pending copies, so that memory does not grow with the dataset size.
+
     Returns:
         None
+
+    Throws:
+        ValueError: when a filepath_image is not in an images directory.
     """
-    for filepath_image in tqdm(filepaths_images):
-        filepath_label = filepath_image_to_filepath_label(filepath_image)
-        filepath_image_destination = save_dir / filepath_image.relative_to(dir_dataset)
-        filepath_label_destination = save_dir / filepath_label.relative_to(dir_dataset)
-        filepath_image_destination.parent.mkdir(parents=True, exist_ok=True)
-        filepath_label_destination.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy(filepath_image, filepath_image_destination)
-        shutil.copy(filepath_label, filepath_label_destination)
+    max_pending = 4 * jobs
+    dirs_dataset_done = set()
+    pending = set()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for filepath_image in filepaths_images:
+            filepath_label = filepath_image_to_filepath_label(filepath_image)
+            if filepath_label is None:
+                raise ValueError(f"{filepath_image} is not in an images directory")
+            # The destination directories only depend on the image directory,
+            # so create them once per directory rather than once per file.
+            if filepath_image.parent not in dirs_dataset_done:
+                for filepath in [filepath_image, filepath_label]:
+                    filepath_destination = save_dir / filepath.relative_to(dir_dataset)
+                    filepath_destination.parent.mkdir(parents=True, exist_ok=True)
+                dirs_dataset_done.add(filepath_image.parent)
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(
+                executor.submit(
+                    copy_image_and_label,
+                    filepath_image=filepath_image,
+                    filepath_label=filepath_label,
+                    save_dir=save_dir,
+                    dir_dataset=dir_dataset,
+                    link_mode=link_mode,
+                )
+            )
+        for future in as_completed(pending):
+            future.result()
 
 
 if __name__ == "__main__":
@@ -163,21 +358,27 @@ if __name__ == "__main__":
         save_dir = args["save_dir"]
         dir_dataset = args["dir_dataset"]
         allowed_dataset_prefixes = args["allowed_dataset_prefixes"]
+        jobs = args["jobs"]
+        link_mode = args["link_mode"]
         logger.info(f"filtering smokes and saving results in {save_dir}")
         save_dir.mkdir(parents=True, exist_ok=True)
-        filepaths_images = list_dataset_images(dir_dataset)
-        logger.info(f"found {len(filepaths_images)} images in {dir_dataset}")
-        filepaths_images_with_smoke = filter_dataset(
-            filepaths_images=filepaths_images,
-            allowed_dataset_prefixes=allowed_dataset_prefixes,
-        )
-        logger.info(
-            f"found {len(filepaths_images_with_smoke)} images with smoke in {dir_dataset}"
-        )
-        logger.info(f"copy over images and labels.")
+        filter_counts = FilterCounts()
+        logger.info(f"filter and copy over images and labels.")
         copy_over(
-            filepaths_images=filepaths_images_with_smoke,
+            filepaths_images=filter_dataset(
+                filepaths_images=list_dataset_images(
+                    dir_dataset=dir_dataset, jobs=jobs
+                ),
+                allowed_dataset_prefixes=allowed_dataset_prefixes,
+                filter_counts=filter_counts,
+            ),
             save_dir=save_dir,
             dir_dataset=dir_dataset,
+            jobs=jobs,
+            link_mode=link_mode,
+        )
+        logger.info(f"found {filter_counts.number_images} images in {dir_dataset}")
+        logger.info(
+            f"found {filter_counts.number_images_with_smoke} images with smoke in {dir_dataset}"
         )
         exit(0)
@@ -4,7 +4,7 @@ CLI Script to perform a data split from the FP_2024 dataset to assign images int
 The folder structure will follow a ultralytics YOLO scaffolding.
 
 Usage:
-    python split_false_positives.py --save-dir <save_directory> --dir-dataset <dataset_directory> --random-seed <seed> [--ratio-train-val <ratio>] [--ratio-val-test <ratio>] [-log <loglevel>]
+    python split_false_positives.py --save-dir <save_directory> --dir-dataset <dataset_directory> --random-seed <seed> [--ratio-train-val <ratio>] [--ratio-val-test <ratio>] [--jobs <jobs>] [--link-mode <link_mode>] [-log <loglevel>]
 
 Arguments:
     --save-dir: Directory to save the splitted dataset.
@@ -12,24 +12,35 @@ Arguments:
     --random-seed: Random Seed to perform the data split (required).
     --ratio-train-val: Ratio for splitting train and val splits (default: 0.9).
     --ratio-val-test: Ratio for splitting val and test splits (default: 0.5).
+    --jobs: Number of threads used to list and copy the images (default: number of CPUs).
+    --link-mode: How to bring the images over to the save dir, one of copy, hardlink, reflink (default: copy).
     -log, --loglevel: Provide logging level. Example --loglevel debug, default=warning.
 """
 
 import argparse
 import logging
+import math
+import os
 import random
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
+from functools import partial
+from itertools import chain
 from pathlib import Path
 
 from tqdm import tqdm
 
 from pyro_dataset.constants import DATE_FORMAT_OUTPUT
+from pyro_dataset.utils import LINK_MODES, link_or_copy_file, list_filepaths
 
 # Date format used in the naming of files in FP_2024
 DATE_FORMAT_INPUT = "%Y-%m-%dT%H-%M-%S"
 
+# (start, length) of the year, month, day, hour, minute and second fields
+# in a datetime string written in DATE_FORMAT_INPUT
+DATETIME_STR_FIELDS = [(0, 4), (5, 2), (8, 2), (11, 2), (14, 2), (17, 2)]
+
 
 @dataclass
 class DataSplit:
@@ -99,6 +110,19 @@ def make_cli_parser() -> argparse.ArgumentParser:
         type=float,
         default=0.5,
     )
+    parser.add_argument(
+        "--jobs",
+        help="Number of threads used to list and copy the images",
+        type=int,
+        default=os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        "--link-mode",
+        help="How to bring the images over to the save dir: copy the data, hardlink or reflink (copy on write) it.",
+        type=str,
+        choices=LINK_MODES,
+        default="copy",
+    )
     parser.add_argument(
         "-log",
         "--loglevel",
@@ -117,6 +141,9 @@ def validate_parsed_args(args: dict) -> bool:
             f"invalid --dir-dataset, dir {args['dir_dataset']} does not exist"
         )
         return False
+    elif args["jobs"] < 1:
+        logging.error(f"invalid --jobs, {args['jobs']} should be at least 1")
+        return False
     else:
         return True
 
@@ -126,12 +153,14 @@ def make_data_split(
     random_seed: float,
     ratio_train_val: float,
     ratio_val_test: float,
+    jobs: int,
 ) -> DataSplit:
     """
     Perform the data split for the FP_2024 dataset using the
     provided `random_seed` and the `ratio_train_val`
 
     __Note__: Prevent train/val leakage by splitting at the folder level.
+    The images of each folder are listed concurrently using `jobs` threads.
 
     Returns:
         data_split (DataSplit): the data split.
@@ -145,27 +174,34 @@ def make_data_split(
 
     rng = random.Random(random_seed)
     folders = list_directories(dir_dataset)
-    folders_shuffled = rng.sample(folders, len(folders))
+    # Shuffle in place rather than sampling a new list. The shuffle selects
+    # the same items as rng.sample does but fills the list from the end, so
+    # reversing it keeps the data split identical to the one from sample.
+    folders_shuffled = folders[:]
+    rng.shuffle(folders_shuffled)
+    folders_shuffled.reverse()
     number_folders = len(folders)
 
-    filepaths_images_train = []
-    filepaths_images_val = []
-    filepaths_images_test = []
-
-    for idx, folder in enumerate(folders_shuffled):
-        filepaths_images = list(folder.glob("**/*.jpg"))
-        if idx < number_folders * ratio_train_val:
-            filepaths_images_train.extend(filepaths_images)
-        elif idx < number_folders * (
-            ratio_train_val + (1 - ratio_train_val) * ratio_val_test
-        ):
-            filepaths_images_val.extend(filepaths_images)
-        else:
-            filepaths_images_test.extend(filepaths_images)
+    # Integer cutoffs such that folders_shuffled[idx] is in train when
+    # idx < number_folders * ratio_train_val, in val when below the second
+    # threshold and in test otherwise.
+    idx_val = math.ceil(number_folders * ratio_train_val)
+    idx_test = math.ceil(
+        number_folders * (ratio_train_val + (1 - ratio_train_val) * ratio_val_test)
+    )
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        filepaths_images_per_folder = list(
+            executor.map(
+                lambda folder: list_filepaths(folder, suffix=".jpg"),
+                folders_shuffled,
+            )
+        )
+
     return DataSplit(
-        train=filepaths_images_train,
-        val=filepaths_images_val,
-        test=filepaths_images_test,
+        train=list(chain.from_iterable(filepaths_images_per_folder[:idx_val])),
+        val=list(chain.from_iterable(filepaths_images_per_folder[idx_val:idx_test])),
+        test=list(chain.from_iterable(filepaths_images_per_folder[idx_test:])),
     )
 
 
@@ -179,6 +215,35 @@ def list_directories(dir_dataset: Path) -> list[Path]:
     return [d for d in dir_dataset.iterdir() if d.is_dir()]
 
 
+def parse_folder_name(folder_name: str) -> tuple[str, int]:
+    """
+    Given the folder_name of an observation, it returns the camera reference
+    and the azimuth it was taken with.
+
+    Returns:
+        camera_reference (str)
+        azimuth (int)
+    """
+    camera_group_reference = folder_name.split("_", 3)[2]
+    camera_reference, _, azimuth_str = camera_group_reference.rpartition("-")
+    return camera_reference, int(azimuth_str)
+
+
+def split_filepath_image(filepath_image: Path) -> tuple[str, str]:
+    """
+    Split a filepath_image into the name of its folder and its stem.
+
+    __Note__: Works on the string representation of the filepath as it is
+    cheaper than going through the `Path` parts.
+
+    Returns:
+        folder_name (str)
+        stem (str)
+    """
+    dirpath, filename = os.path.split(os.fspath(filepath_image))
+    return os.path.basename(dirpath), filename.rpartition(".")[0]
+
+
 def parse_filepath_image(filepath_image: Path) -> ObservationMetadata:
     """
     Given a filepath_image, it returns an ObservationMetadata containing some
@@ -188,86 +253,168 @@ def parse_filepath_image(filepath_image: Path) -> ObservationMetadata:
     Returns:
         observation_metadata (ObservationMetadata)
     """
-    folder_name = filepath_image.parts[-2]
-    camera_group_reference = folder_name.split("_")[2]
-    camera_reference = "-".join(camera_group_reference.split("-")[:-1])
-    azimuth_str = camera_group_reference.split("-")[-1]
-    datetime_str = filepath_image.stem
+    folder_name, datetime_str = split_filepath_image(filepath_image)
+    camera_reference, azimuth = parse_folder_name(folder_name)
     return ObservationMetadata(
         camera_reference=camera_reference,
         datetime=datetime.strptime(datetime_str, DATE_FORMAT_INPUT),
-        azimuth=int(azimuth_str),
+        azimuth=azimuth,
     )
 
 
+def is_normalized_datetime_str(datetime_str: str) -> bool:
+    """
+    Is the `datetime_str` a valid datetime already written in
+    DATE_FORMAT_INPUT (`%Y-%m-%dT%H-%M-%S`) with zero padded fields?
+
+    __Note__: Much cheaper than a `datetime.strptime` as it only checks the
+    fixed width layout and the ranges of the fields.
+
+    Returns:
+        is_normalized? (bool)
+    """
+    if len(datetime_str) != 19:
+        return False
+    if datetime_str[10] != "T" or any(datetime_str[i] != "-" for i in (4, 7, 13, 16)):
+        return False
+    fields = [datetime_str[i : i + n] for i, n in DATETIME_STR_FIELDS]
+    if not all(field.isascii() and field.isdigit() for field in fields):
+        return False
+    try:
+        datetime(*map(int, fields))
+    except ValueError:
+        return False
+    return True
+
+
+def to_filename_stem(filepath_image: Path) -> str:
+    """
+    Turn a filepath_image into a filename stem, following the proper
+    naming convention.
+
+    __Note__: When DATE_FORMAT_INPUT and DATE_FORMAT_OUTPUT match, a
+    normalized datetime stem is reused as is. Any other stem goes through
+    `datetime.strptime` which normalizes it or fails on invalid dates.
+
+    Returns:
+        filename_stem (str)
+
+    Throws:
+        ValueError: when the filepath_image stem is not a valid datetime.
+    """
+    folder_name, datetime_str = split_filepath_image(filepath_image)
+    camera_reference, azimuth = parse_folder_name(folder_name)
+    if not (
+        DATE_FORMAT_INPUT == DATE_FORMAT_OUTPUT
+        and is_normalized_datetime_str(datetime_str)
+    ):
+        datetime_str = datetime.strptime(datetime_str, DATE_FORMAT_INPUT).strftime(
+            DATE_FORMAT_OUTPUT
+        )
+    filename_prefix = f"pyronear_{camera_reference}-{azimuth}".lower()
+    return f"{filename_prefix}_{datetime_str}"
+
+
 def to_filepath_image_destination(
     save_dir: Path,
-    filepath_image: Path,
+    filename_stem: str,
     split: str,
 ) -> Path:
     """
-    Turn a filepath_image into its filepath destination, adding the proper
-    naming convention to it.
+    Turn a filename_stem into its image filepath destination.
 
     Returns:
         filepath_image_destination (Path)
     """
-    observation_metadata = parse_filepath_image(filepath_image)
-    filename_prefix = f"pyronear_{observation_metadata.camera_reference}-{observation_metadata.azimuth}".lower()
-    filename = f"{filename_prefix}_{observation_metadata.datetime.strftime(DATE_FORMAT_OUTPUT)}.jpg"
-    filepath_image_destination = save_dir / "images" / split / filename
-    return filepath_image_destination
+    return save_dir / "images" / split / f"{filename_stem}.jpg"
 
 
 def to_filepath_label_destination(
     save_dir: Path,
-    filepath_image: Path,
+    filename_stem: str,
     split: str,
 ) -> Path:
     """
-    Turn a filepath_image into its filepath destination, adding the proper
-    naming convention to it.
+    Turn a filename_stem into its label filepath destination.
 
     Returns:
         filepath_label_destination (Path)
     """
-    observation_metadata = parse_filepath_image(filepath_image)
-    filename_prefix = f"pyronear_{observation_metadata.camera_reference}-{observation_metadata.azimuth}".lower()
-    filename = f"{filename_prefix}_{observation_metadata.datetime.strftime(DATE_FORMAT_OUTPUT)}.txt"
-    filepath_label_destination = save_dir / "labels" / split / filename
-    return filepath_label_destination
+    return save_dir / "labels" / split / f"{filename_stem}.txt"
+
+
+def persist_filepath_image(
+    filepath_image: Path,
+    save_dir: Path,
+    split: str,
+    link_mode: str,
+) -> None:
+    """
+    Persist the filepath_image in the split of save_dir along with an empty label.
+    The split directories are expected to exist.
+
+    Returns:
+        None
+    """
+    filename_stem = to_filename_stem(filepath_image)
+    filepath_image_destination = to_filepath_image_destination(
+        save_dir=save_dir,
+        filename_stem=filename_stem,
+        split=split,
+    )
+    filepath_label_destination = to_filepath_label_destination(
+        save_dir=save_dir,
+        filename_stem=filename_stem,
+        split=split,
+    )
+    link_or_copy_file(filepath_image, filepath_image_destination, link_mode)
+    # Create the empty label without the utime call made by Path.touch
+    os.close(os.open(filepath_label_destination, os.O_WRONLY | os.O_CREAT, 0o666))
 
 
 def persist_data_split(
     data_split: DataSplit,
     save_dir: Path,
+    jobs: int,
+    link_mode: str,
 ) -> None:
     """
     Persist the data_split in save_dir, structure it in a regular yolo folder structure.
 
+    __Note__: The copies are I/O bound and are run concurrently using `jobs` threads.
+    The images are hardlinked or reflinked instead when `link_mode` says so.
+
     Returns:
         None
     """
-    for split, split_xs in [
-        ("train", data_split.train),
-        ("val", data_split.val),
-        ("test", data_split.test),
-    ]:
-        for filepath_image in tqdm(split_xs):
-            filepath_image_destination = to_filepath_image_destination(
-                save_dir=save_dir,
-                filepath_image=filepath_image,
-                split=split,
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for split, split_xs in [
+            ("train", data_split.train),
+            ("val", data_split.val),
+            ("test", data_split.test),
+        ]:
+            if split_xs:
+                (save_dir / "images" / split).mkdir(parents=True, exist_ok=True)
+                (save_dir / "labels" / split).mkdir(parents=True, exist_ok=True)
+            results = executor.map(
+                partial(
+                    persist_filepath_image,
+                    save_dir=save_dir,
+                    split=split,
+                    link_mode=link_mode,
+                ),
+                split_xs,
             )
-            filepath_label_destination = to_filepath_label_destination(
-                save_dir=save_dir,
-                filepath_image=filepath_image,
-                split=split,
+            # Refresh the progress bar sparingly as each copy is fast.
+            list(
+                tqdm(
+                    results,
+                    total=len(split_xs),
+                    mininterval=0.5,
+                    miniters=256,
+                    smoothing=0,
+                )
             )
-            filepath_image_destination.parent.mkdir(parents=True, exist_ok=True)
-            filepath_label_destination.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy(filepath_image, filepath_image_destination)
-            filepath_label_destination.touch()
 
 
 if __name__ == "__main__":
@@ -284,6 +431,8 @@ if __name__ == "__main__":
         random_seed = args["random_seed"]
         ratio_train_val = args["ratio_train_val"]
         ratio_val_test = args["ratio_val_test"]
+        jobs = args["jobs"]
+        link_mode = args["link_mode"]
 
         logger.info(f"save results in {save_dir}")
         save_dir.mkdir(parents=True, exist_ok=True)
@@ -296,10 +445,16 @@ if __name__ == "__main__":
             random_seed=random_seed,
             ratio_train_val=ratio_train_val,
             ratio_val_test=ratio_val_test,
+            jobs=jobs,
         )
         logger.info(
             f"datasplit: {len(data_split.train)} images in train - {len(data_split.val)} images in val - {len(data_split.test)} images in test."
         )
         logger.info(f"persist the data split in {save_dir}.")
-        persist_data_split(data_split=data_split, save_dir=save_dir)
+        persist_data_split(
+            data_split=data_split,
+            save_dir=save_dir,
+            jobs=jobs,
+            link_mode=link_mode,
+        )
         exit(0)
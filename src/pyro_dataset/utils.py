@@ -1,10 +1,27 @@
+import errno
 import hashlib
 import logging
+import os
 import shutil
 from pathlib import Path
 
 import yaml
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Buffer size used when copying files in userspace, larger than the 64 KiB
+# default of shutil to reduce the number of read/write calls.
+COPY_BUFFER_SIZE = 1 << 18
+
+# Linux ioctl to share the extents of a file with another one (reflink).
+FICLONE = 0x40049409
+
+# Supported modes to bring a file over from one dataset to another.
+LINK_MODES = ["copy", "hardlink", "reflink"]
+
 
 def compute_file_content_sha256(filepath: Path) -> str:
     """
@@ -26,6 +43,175 @@ def compute_file_content_sha256(filepath: Path) -> str:
     return hash_sha256.hexdigest()
 
 
+def list_filepaths(dir_root: Path, suffix: str) -> list[Path]:
+    """
+    Recursively list all files in `dir_root` whose name ends with `suffix`.
+
+    __Note__: Walks the tree with `os.walk` rather than `Path.glob` to
+    avoid pattern matching and `Path` allocations for the entries that are
+    skipped. Symlinked directories are not followed.
+
+    Returns:
+        filepaths (list[Path]): all matching filepaths from dir_root.
+    """
+    return [
+        Path(dirpath, filename)
+        for dirpath, _, filenames in os.walk(dir_root, followlinks=False)
+        for filename in filenames
+        if filename.endswith(suffix)
+    ]
+
+
+def copy_file(src: Path, dst: Path) -> None:
+    """
+    Copy the content of the file `src` to `dst`, metadata is not copied over.
+
+    __Note__: Uses `os.copy_file_range` so that the data is copied in the
+    kernel (as a reflink on btrfs/XFS), falling back to a userspace copy
+    when it is not supported by the platform or the filesystems.
+    """
+    fd_src, fd_dst = _open_src_dst(src, dst)
+    try:
+        _copy_fd(fd_src, fd_dst)
+    finally:
+        os.close(fd_src)
+        os.close(fd_dst)
+
+
+def _open_src_dst(src: Path, dst: Path) -> tuple[int, int]:
+    """
+    Open `src` for reading and `dst` for writing, truncating it.
+
+    __Note__: Raw file descriptors are used rather than python file objects,
+    as `open` issues a few extra syscalls (fstat, ioctl, lseek) per file.
+    `dst` is only truncated once it is known not to be the same file as
+    `src`. When `dst` is a hardlink of `src`, e.g. left by a previous run
+    with the hardlink link mode, it is replaced by a new file.
+
+    Returns:
+        fd_src (int)
+        fd_dst (int)
+
+    Throws:
+        shutil.SameFileError: when `src` and `dst` are the same path.
+    """
+    o_binary = getattr(os, "O_BINARY", 0)
+    flags_dst = os.O_WRONLY | os.O_CREAT | o_binary
+    fd_src = os.open(src, os.O_RDONLY | o_binary)
+    fd_dst = None
+    try:
+        fd_dst = os.open(dst, flags_dst, 0o666)
+        stat_src = os.fstat(fd_src)
+        stat_dst = os.fstat(fd_dst)
+        if os.path.samestat(stat_src, stat_dst):
+            os.close(fd_dst)
+            fd_dst = None
+            if _is_same_path(src, dst):
+                raise shutil.SameFileError(f"{src} and {dst} are the same file")
+            os.unlink(dst)
+            fd_dst = os.open(dst, flags_dst | os.O_EXCL, 0o666)
+        elif stat_dst.st_size > 0:
+            os.ftruncate(fd_dst, 0)
+    except BaseException:
+        os.close(fd_src)
+        if fd_dst is not None:
+            os.close(fd_dst)
+        raise
+    return fd_src, fd_dst
+
+
+def _is_same_path(src: Path, dst: Path) -> bool:
+    """
+    Do `src` and `dst` point to the same directory entry?
+    """
+    return os.path.basename(src) == os.path.basename(dst) and os.path.samefile(
+        os.path.dirname(os.path.abspath(src)), os.path.dirname(os.path.abspath(dst))
+    )
+
+
+def _copy_fd(fd_src: int, fd_dst: int) -> None:
+    """
+    Copy the content of the opened file `fd_src` to the opened file `fd_dst`.
+
+    __Note__: Some kernels and filesystems make `os.copy_file_range` return 0
+    without copying anything, so the userspace copy is also used when
+    nothing was copied from a non empty `fd_src`.
+    """
+    try:
+        number_bytes_copied = 0
+        while (number_bytes := os.copy_file_range(fd_src, fd_dst, 1 << 30)) > 0:
+            number_bytes_copied += number_bytes
+        if number_bytes_copied > 0 or os.fstat(fd_src).st_size == 0:
+            return
+    except (AttributeError, OSError):
+        pass
+    with (
+        open(fd_src, "rb", closefd=False) as fsrc,
+        open(fd_dst, "wb", closefd=False) as fdst,
+    ):
+        shutil.copyfileobj(fsrc, fdst, COPY_BUFFER_SIZE)
+
+
+def reflink_file(src: Path, dst: Path) -> None:
+    """
+    Clone the file `src` to `dst` so that they share the same data blocks
+    until one of them is modified (copy on write).
+
+    __Note__: Only supported by some filesystems (btrfs, XFS), falls back to
+    a regular copy otherwise.
+    """
+    fd_src, fd_dst = _open_src_dst(src, dst)
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fd_dst, FICLONE, fd_src)
+                return
+            except OSError:
+                pass
+        _copy_fd(fd_src, fd_dst)
+    finally:
+        os.close(fd_src)
+        os.close(fd_dst)
+
+
+def hardlink_file(src: Path, dst: Path) -> None:
+    """
+    Hardlink the file `src` to `dst`, replacing `dst` if it already exists.
+
+    __Note__: Falls back to `copy_file` when `src` and `dst` are not on the
+    same filesystem. Linux reports EEXIST before EXDEV, so the fallback also
+    covers the retry once an existing `dst` is removed.
+    """
+    try:
+        try:
+            os.link(src, dst)
+        except FileExistsError:
+            os.unlink(dst)
+            os.link(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        copy_file(src, dst)
+
+
+def link_or_copy_file(src: Path, dst: Path, link_mode: str = "copy") -> None:
+    """
+    Bring the file `src` over to `dst` using the provided `link_mode`, one of
+    LINK_MODES.
+
+    Throws:
+        ValueError: when the link_mode is not supported.
+    """
+    if link_mode == "copy":
+        copy_file(src, dst)
+    elif link_mode == "hardlink":
+        hardlink_file(src, dst)
+    elif link_mode == "reflink":
+        reflink_file(src, dst)
+    else:
+        raise ValueError(f"invalid link_mode {link_mode}, should be in {LINK_MODES}")
+
+
 class MyDumper(yaml.Dumper):
     """Formatter for dumping yaml."""
 
@@ -0,0 +1,205 @@
+"""
+Tests for the filter_data_pyronear_ds_smoke script.
+"""
+
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+# Scripts are not part of the package, load it from its filepath
+spec = importlib.util.spec_from_file_location(
+    "filter_data_pyronear_ds_smoke",
+    Path(__file__).parents[2] / "scripts" / "filter_data_pyronear_ds_smoke.py",
+)
+filter_data_pyronear_ds_smoke = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(filter_data_pyronear_ds_smoke)
+
+
+def test_filepath_image_to_filepath_label():
+    """Test that only the last images directory is replaced."""
+    filepath_image = Path("images_ds") / "images" / "train" / "pyronear_a.jpg"
+
+    filepath_label = filter_data_pyronear_ds_smoke.filepath_image_to_filepath_label(
+        filepath_image
+    )
+
+    assert filepath_label == Path("images_ds") / "labels" / "train" / "pyronear_a.txt"
+
+
+def test_filepath_image_to_filepath_label_nested_images_dirs():
+    """Test that an images directory higher up in the path is left untouched."""
+    filepath_image = Path("images") / "ds" / "images" / "train" / "pyronear_a.jpg"
+
+    filepath_label = filter_data_pyronear_ds_smoke.filepath_image_to_filepath_label(
+        filepath_image
+    )
+
+    assert (
+        filepath_label == Path("images") / "ds" / "labels" / "train" / "pyronear_a.txt"
+    )
+
+
+def test_filepath_image_to_filepath_label_no_images_dir():
+    """Test that an image outside of an images directory has no label."""
+    filepath_image = Path("ds") / "extra" / "pyronear_stray.jpg"
+
+    assert (
+        filter_data_pyronear_ds_smoke.filepath_image_to_filepath_label(filepath_image)
+        is None
+    )
+
+
+def test_filter_dataset(tmp_path: Path):
+    """Test that only the allowed images with a non empty label are kept."""
+    # Arrange: a small dataset with a stray image outside of images/
+    (tmp_path / "images" / "train").mkdir(parents=True)
+    (tmp_path / "labels" / "train").mkdir(parents=True)
+    (tmp_path / "extra").mkdir()
+    for name in ["pyronear_smoke", "pyronear_empty", "pyronear_nolabel", "other_smoke"]:
+        (tmp_path / "images" / "train" / f"{name}.jpg").touch()
+    (tmp_path / "labels" / "train" / "pyronear_smoke.txt").write_text(
+        "0 0.5 0.5 0.1 0.1\n"
+    )
+    (tmp_path / "labels" / "train" / "pyronear_empty.txt").touch()
+    (tmp_path / "labels" / "train" / "other_smoke.txt").write_text(
+        "0 0.5 0.5 0.1 0.1\n"
+    )
+    (tmp_path / "extra" / "pyronear_stray.jpg").touch()
+    filter_counts = filter_data_pyronear_ds_smoke.FilterCounts()
+
+    # Act
+    filepaths_images = list(
+        filter_data_pyronear_ds_smoke.filter_dataset(
+            filepaths_images=filter_data_pyronear_ds_smoke.list_dataset_images(
+                dir_dataset=tmp_path, jobs=2
+            ),
+            allowed_dataset_prefixes=["pyronear"],
+            filter_counts=filter_counts,
+        )
+    )
+
+    # Assert
+    assert filepaths_images == [tmp_path / "images" / "train" / "pyronear_smoke.jpg"]
+    assert filter_counts.number_images == 5
+    assert filter_counts.number_images_with_smoke == 1
+
+
+def test_filter_dataset_interleaved_directories(tmp_path: Path):
+    """Test that images not grouped by directory are still filtered correctly."""
+    # Arrange: alternate images from two splits
+    filepaths_images = []
+    for split in ["train", "val"]:
+        (tmp_path / "images" / split).mkdir(parents=True)
+        (tmp_path / "labels" / split).mkdir(parents=True)
+        (tmp_path / "images" / split / "pyronear_a.jpg").touch()
+        (tmp_path / "labels" / split / "pyronear_a.txt").write_text(
+            "0 0.5 0.5 0.1 0.1\n"
+        )
+    for _ in range(2):
+        for split in ["train", "val"]:
+            filepaths_images.append(tmp_path / "images" / split / "pyronear_a.jpg")
+
+    # Act
+    filepaths_images_with_smoke = list(
+        filter_data_pyronear_ds_smoke.filter_dataset(
+            filepaths_images=filepaths_images,
+            allowed_dataset_prefixes=["pyronear"],
+            filter_counts=filter_data_pyronear_ds_smoke.FilterCounts(),
+        )
+    )
+
+    # Assert
+    assert filepaths_images_with_smoke == filepaths_images
+
+
+def test_copy_over(tmp_path: Path, monkeypatch):
+    """Test that images and labels are copied over, creating each directory once."""
+    # Arrange: two splits with a few images each
+    dir_dataset = tmp_path / "ds"
+    save_dir = tmp_path / "out"
+    filepaths_images = []
+    for split in ["train", "val"]:
+        (dir_dataset / "images" / split).mkdir(parents=True)
+        (dir_dataset / "labels" / split).mkdir(parents=True)
+        for i in range(3):
+            filepath_image = dir_dataset / "images" / split / f"pyronear_{i}.jpg"
+            filepath_image.write_bytes(f"{split}{i}".encode())
+            (dir_dataset / "labels" / split / f"pyronear_{i}.txt").write_text(
+                f"0 0.5 0.5 0.1 {i}\n"
+            )
+            filepaths_images.append(filepath_image)
+    dirs_created = []
+    mkdir = Path.mkdir
+    mkdir_depth = [0]
+
+    def mkdir_recorded(self, *args, **kwargs):
+        # Only record the top level calls, not the recursive parents ones
+        if mkdir_depth[0] == 0:
+            dirs_created.append(self)
+        mkdir_depth[0] += 1
+        try:
+            mkdir(self, *args, **kwargs)
+        finally:
+            mkdir_depth[0] -= 1
+
+    monkeypatch.setattr(Path, "mkdir", mkdir_recorded)
+
+    # Act
+    filter_data_pyronear_ds_smoke.copy_over(
+        filepaths_images=iter(filepaths_images),
+        save_dir=save_dir,
+        dir_dataset=dir_dataset,
+        jobs=2,
+        link_mode="copy",
+    )
+
+    # Assert
+    assert sorted(dirs_created) == sorted(
+        save_dir / kind / split
+        for kind in ["images", "labels"]
+        for split in ["train", "val"]
+    )
+    for filepath in dir_dataset.rglob("*.*"):
+        filepath_destination = save_dir / filepath.relative_to(dir_dataset)
+        assert filepath_destination.read_bytes() == filepath.read_bytes()
+
+
+def test_copy_over_propagates_worker_errors(tmp_path: Path):
+    """Test that a failing copy is raised, even past the pending copies window."""
+    # Arrange: more images than the pending copies window, the first one
+    # missing its label
+    (tmp_path / "images" / "train").mkdir(parents=True)
+    (tmp_path / "labels" / "train").mkdir(parents=True)
+    filepaths_images = []
+    for i in range(20):
+        filepath_image = tmp_path / "images" / "train" / f"pyronear_{i:02d}.jpg"
+        filepath_image.touch()
+        if i > 0:
+            (tmp_path / "labels" / "train" / f"pyronear_{i:02d}.txt").touch()
+        filepaths_images.append(filepath_image)
+
+    # Act & Assert
+    with pytest.raises(FileNotFoundError):
+        filter_data_pyronear_ds_smoke.copy_over(
+            filepaths_images=iter(filepaths_images),
+            save_dir=tmp_path / "out",
+            dir_dataset=tmp_path,
+            jobs=1,
+            link_mode="copy",
+        )
+
+
+def test_copy_over_image_outside_images_dir(tmp_path: Path):
+    """Test that an image outside of an images directory raises a ValueError."""
+    (tmp_path / "extra").mkdir()
+    (tmp_path / "extra" / "pyronear_stray.jpg").touch()
+
+    with pytest.raises(ValueError):
+        filter_data_pyronear_ds_smoke.copy_over(
+            filepaths_images=[tmp_path / "extra" / "pyronear_stray.jpg"],
+            save_dir=tmp_path / "out",
+            dir_dataset=tmp_path,
+            jobs=1,
+            link_mode="copy",
+        )
@@ -0,0 +1,163 @@
+"""
+Tests for the split_false_positives script.
+"""
+
+import importlib.util
+import random
+from pathlib import Path
+
+import pytest
+
+# Scripts are not part of the package, load it from its filepath
+spec = importlib.util.spec_from_file_location(
+    "split_false_positives",
+    Path(__file__).parents[2] / "scripts" / "split_false_positives.py",
+)
+split_false_positives = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(split_false_positives)
+
+FOLDER_NAME = "sdis-07_seq_brison-200_x"
+
+
+def test_to_filename_stem():
+    """Test that a normalized datetime stem is reused as is."""
+    filepath_image = Path("fp") / FOLDER_NAME / "2024-02-01T10-00-30.jpg"
+
+    filename_stem = split_false_positives.to_filename_stem(filepath_image)
+
+    assert filename_stem == "pyronear_brison-200_2024-02-01T10-00-30"
+
+
+def test_to_filename_stem_not_zero_padded():
+    """Test that a datetime stem without zero padding gets normalized."""
+    filepath_image = Path("fp") / FOLDER_NAME / "2024-2-1T10-0-30.jpg"
+
+    filename_stem = split_false_positives.to_filename_stem(filepath_image)
+
+    assert filename_stem == "pyronear_brison-200_2024-02-01T10-00-30"
+
+
+@pytest.mark.parametrize(
+    "stem",
+    ["notadate", "2024-13-01T10-00-30", "2024-02-01T10-00-3x", "2024-02-01T10:00:30"],
+)
+def test_to_filename_stem_invalid_datetime(stem: str):
+    """Test that a stem that is not a valid datetime raises a ValueError."""
+    filepath_image = Path("fp") / FOLDER_NAME / f"{stem}.jpg"
+
+    with pytest.raises(ValueError):
+        split_false_positives.to_filename_stem(filepath_image)
+
+
+def make_data_split_reference(
+    dir_dataset: Path,
+    random_seed: int,
+    ratio_train_val: float,
+    ratio_val_test: float,
+) -> tuple[list[Path], list[Path], list[Path]]:
+    """Reference data split using rng.sample and a per folder threshold check."""
+    rng = random.Random(random_seed)
+    folders = split_false_positives.list_directories(dir_dataset)
+    number_folders = len(folders)
+    train, val, test = [], [], []
+    for idx, folder in enumerate(rng.sample(folders, number_folders)):
+        filepaths_images = sorted(folder.glob("**/*.jpg"))
+        if idx < number_folders * ratio_train_val:
+            train.extend(filepaths_images)
+        elif idx < number_folders * (
+            ratio_train_val + (1 - ratio_train_val) * ratio_val_test
+        ):
+            val.extend(filepaths_images)
+        else:
+            test.extend(filepaths_images)
+    return train, val, test
+
+
+@pytest.mark.parametrize("random_seed", [0, 1, 42])
+@pytest.mark.parametrize(
+    "ratio_train_val,ratio_val_test",
+    [(0.8, 0.5), (0.7, 1 / 3), (0.1, 0.9), (0.9, 0.3), (0.0, 0.5), (1.0, 0.5)],
+)
+def test_make_data_split_matches_reference(
+    tmp_path: Path,
+    random_seed: int,
+    ratio_train_val: float,
+    ratio_val_test: float,
+):
+    """Test that the data split matches the one from rng.sample for many sizes."""
+    for number_folders in range(13):
+        # Arrange: a dataset with number_folders folders of one image each
+        dir_dataset = tmp_path / f"ds_{number_folders}"
+        dir_dataset.mkdir()
+        for i in range(number_folders):
+            (dir_dataset / f"{FOLDER_NAME}{i}").mkdir()
+            (dir_dataset / f"{FOLDER_NAME}{i}" / "2024-02-01T10-00-00.jpg").touch()
+
+        # Act
+        data_split = split_false_positives.make_data_split(
+            dir_dataset=dir_dataset,
+            random_seed=random_seed,
+            ratio_train_val=ratio_train_val,
+            ratio_val_test=ratio_val_test,
+            jobs=2,
+        )
+
+        # Assert
+        assert (data_split.train, data_split.val, data_split.test) == (
+            make_data_split_reference(
+                dir_dataset=dir_dataset,
+                random_seed=random_seed,
+                ratio_train_val=ratio_train_val,
+                ratio_val_test=ratio_val_test,
+            )
+        )
+
+
+def test_persist_data_split(tmp_path: Path):
+    """Test that the split is persisted in a yolo folder structure with empty labels."""
+    # Arrange: an empty test split and a label left by a previous run
+    dir_folder = tmp_path / "fp" / FOLDER_NAME
+    dir_folder.mkdir(parents=True)
+    filepaths_images = []
+    for second in range(3):
+        filepath_image = dir_folder / f"2024-02-01T10-00-0{second}.jpg"
+        filepath_image.write_bytes(f"image{second}".encode())
+        filepaths_images.append(filepath_image)
+    data_split = split_false_positives.DataSplit(
+        train=filepaths_images[:2],
+        val=filepaths_images[2:],
+        test=[],
+    )
+    save_dir = tmp_path / "out"
+    filepath_label_existing = (
+        save_dir / "labels" / "train" / "pyronear_brison-200_2024-02-01T10-00-00.txt"
+    )
+    filepath_label_existing.parent.mkdir(parents=True)
+    filepath_label_existing.write_text("0 0.5 0.5 0.1 0.1\n")
+
+    # Act
+    split_false_positives.persist_data_split(
+        data_split=data_split,
+        save_dir=save_dir,
+        jobs=2,
+        link_mode="copy",
+    )
+
+    # Assert
+    assert not (save_dir / "images" / "test").exists()
+    assert not (save_dir / "labels" / "test").exists()
+    for split, split_xs in [("train", data_split.train), ("val", data_split.val)]:
+        for filepath_image in split_xs:
+            filename_stem = f"pyronear_brison-200_{filepath_image.stem}"
+            filepath_image_destination = (
+                save_dir / "images" / split / f"{filename_stem}.jpg"
+            )
+            filepath_label_destination = (
+                save_dir / "labels" / split / f"{filename_stem}.txt"
+            )
+            assert filepath_image_destination.read_bytes() == (
+                filepath_image.read_bytes()
+            )
+            if filepath_label_destination != filepath_label_existing:
+                assert filepath_label_destination.read_bytes() == b""
+    assert filepath_label_existing.read_text() == "0 0.5 0.5 0.1 0.1\n"
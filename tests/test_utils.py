@@ -0,0 +1,218 @@
+"""
+Tests for the generic utility functions.
+"""
+
+import errno
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from pyro_dataset.utils import LINK_MODES, copy_file, link_or_copy_file, list_filepaths
+
+
+def test_list_filepaths_recursive(tmp_path: Path):
+    """Test that matching files are listed from all nested directories."""
+    # Arrange: a small tree with matching and non matching files
+    (tmp_path / "images" / "train").mkdir(parents=True)
+    (tmp_path / "labels" / "train").mkdir(parents=True)
+    (tmp_path / "a.jpg").touch()
+    (tmp_path / "images" / "train" / "b.jpg").touch()
+    (tmp_path / "labels" / "train" / "b.txt").touch()
+
+    # Act
+    filepaths = list_filepaths(tmp_path, suffix=".jpg")
+
+    # Assert: only the .jpg files are returned, as Path objects
+    assert sorted(filepaths) == sorted(
+        [tmp_path / "a.jpg", tmp_path / "images" / "train" / "b.jpg"]
+    )
+
+
+def test_list_filepaths_does_not_follow_symlinks(tmp_path: Path):
+    """Test that symlinked directories are not walked."""
+    (tmp_path / "images").mkdir()
+    (tmp_path / "images" / "a.jpg").touch()
+    (tmp_path / "images_link").symlink_to(tmp_path / "images")
+
+    filepaths = list_filepaths(tmp_path, suffix=".jpg")
+
+    assert filepaths == [tmp_path / "images" / "a.jpg"]
+
+
+def test_list_filepaths_empty_dir(tmp_path: Path):
+    """Test that an empty directory yields no filepaths."""
+    assert list_filepaths(tmp_path, suffix=".jpg") == []
+
+
+def test_copy_file(tmp_path: Path):
+    """Test that the file content is copied over and the source is left untouched."""
+    # Arrange: a source file bigger than a single read buffer
+    content = bytes(range(256)) * 4096
+    src = tmp_path / "src.jpg"
+    src.write_bytes(content)
+    dst = tmp_path / "dst.jpg"
+
+    # Act
+    copy_file(src, dst)
+
+    # Assert
+    assert dst.read_bytes() == content
+    assert src.read_bytes() == content
+
+
+def test_copy_file_empty(tmp_path: Path):
+    """Test that an empty file is copied over as an empty file."""
+    src = tmp_path / "src.txt"
+    src.touch()
+    dst = tmp_path / "dst.txt"
+
+    copy_file(src, dst)
+
+    assert dst.read_bytes() == b""
+
+
+def test_copy_file_fallback(tmp_path: Path, monkeypatch):
+    """Test that the userspace copy is used when copy_file_range is not supported."""
+
+    # Arrange: make the kernel copy fail as it would across filesystems
+    def copy_file_range_unsupported(*args, **kwargs):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(os, "copy_file_range", copy_file_range_unsupported)
+    content = b"smoke" * 1000
+    src = tmp_path / "src.jpg"
+    src.write_bytes(content)
+    dst = tmp_path / "dst.jpg"
+
+    # Act
+    copy_file(src, dst)
+
+    # Assert
+    assert dst.read_bytes() == content
+
+
+def test_copy_file_fallback_nothing_copied(tmp_path: Path, monkeypatch):
+    """Test that the userspace copy is used when copy_file_range copies nothing."""
+
+    # Arrange: make the kernel copy return 0 as some filesystems do
+    def copy_file_range_noop(*args, **kwargs):
+        return 0
+
+    monkeypatch.setattr(os, "copy_file_range", copy_file_range_noop)
+    content = b"smoke" * 1000
+    src = tmp_path / "src.jpg"
+    src.write_bytes(content)
+    dst = tmp_path / "dst.jpg"
+
+    # Act
+    copy_file(src, dst)
+
+    # Assert
+    assert dst.read_bytes() == content
+
+
+@pytest.mark.parametrize("link_mode", LINK_MODES)
+def test_link_or_copy_file(tmp_path: Path, link_mode: str):
+    """Test that every link_mode brings the file content over."""
+    content = b"smoke" * 1000
+    src = tmp_path / "src.jpg"
+    src.write_bytes(content)
+    dst = tmp_path / "dst.jpg"
+
+    link_or_copy_file(src, dst, link_mode=link_mode)
+
+    assert dst.read_bytes() == content
+    assert os.path.samefile(src, dst) == (link_mode == "hardlink")
+
+
+@pytest.mark.parametrize("link_mode", ["copy", "reflink"])
+def test_link_or_copy_file_over_hardlink(tmp_path: Path, link_mode: str):
+    """Test that copying over a hardlink of the source leaves the source untouched."""
+    # Arrange: a destination left by a previous run with the hardlink link mode
+    content = b"smoke" * 1000
+    src = tmp_path / "src.jpg"
+    src.write_bytes(content)
+    dst = tmp_path / "dst.jpg"
+    link_or_copy_file(src, dst, link_mode="hardlink")
+
+    # Act
+    link_or_copy_file(src, dst, link_mode=link_mode)
+
+    # Assert
+    assert src.read_bytes() == content
+    assert dst.read_bytes() == content
+    assert not os.path.samefile(src, dst)
+
+
+@pytest.mark.parametrize("link_mode", ["copy", "reflink"])
+def test_link_or_copy_file_same_path(tmp_path: Path, link_mode: str):
+    """Test that copying a file onto itself raises and leaves it untouched."""
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"smoke")
+
+    with pytest.raises(shutil.SameFileError):
+        link_or_copy_file(src, tmp_path / "." / "src.jpg", link_mode=link_mode)
+
+    assert src.read_bytes() == b"smoke"
+
+
+@pytest.mark.parametrize("link_mode", ["copy", "reflink"])
+def test_link_or_copy_file_existing_destination(tmp_path: Path, link_mode: str):
+    """Test that an existing, longer destination file is overwritten."""
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"new")
+    dst = tmp_path / "dst.jpg"
+    dst.write_bytes(b"old and longer")
+
+    link_or_copy_file(src, dst, link_mode=link_mode)
+
+    assert dst.read_bytes() == b"new"
+
+
+def test_link_or_copy_file_hardlink_existing_destination(tmp_path: Path):
+    """Test that hardlinking replaces an existing destination file."""
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"new")
+    dst = tmp_path / "dst.jpg"
+    dst.write_bytes(b"old")
+
+    link_or_copy_file(src, dst, link_mode="hardlink")
+
+    assert dst.read_bytes() == b"new"
+    assert os.path.samefile(src, dst)
+
+
+def test_link_or_copy_file_hardlink_existing_destination_cross_device(
+    tmp_path: Path, monkeypatch
+):
+    """Test that an existing destination on another filesystem is copied over."""
+
+    # Arrange: mimic Linux reporting EEXIST before EXDEV
+    def link_cross_device(src, dst):
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST))
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(os, "link", link_cross_device)
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"new")
+    dst = tmp_path / "dst.jpg"
+    dst.write_bytes(b"old")
+
+    # Act
+    link_or_copy_file(src, dst, link_mode="hardlink")
+
+    # Assert
+    assert dst.read_bytes() == b"new"
+    assert not os.path.samefile(src, dst)
+
+
+def test_link_or_copy_file_invalid_link_mode(tmp_path: Path):
+    """Test that an unsupported link_mode raises a ValueError."""
+    src = tmp_path / "src.jpg"
+    src.touch()
+
+    with pytest.raises(ValueError):
+        link_or_copy_file(src, tmp_path / "dst.jpg", link_mode="symlink")